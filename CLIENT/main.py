@@ -1,6 +1,9 @@
 import streamlit as st
 import requests
-from requests.auth import HTTPBasicAuth
+from requests.adapters import HTTPAdapter
+from requests_toolbelt import MultipartEncoder, MultipartEncoderMonitor
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 import time
 import os
@@ -12,13 +15,31 @@ API_BASE = os.getenv("API_BASE")
 AVATAR_USER = os.getenv("AVATAR_USER")
 AVATAR_AI   = os.getenv("AVATAR_AI")
 
+# Backend endpoints, built once at import
+URLS = {name: f"{API_BASE}{path}" for name, path in {
+    "login": "/auth/login",
+    "signup": "/auth/signup",
+    "verify": "/auth/verify-email",
+    "forgot": "/auth/forgot-password",
+    "reset": "/auth/reset-password",
+    "chat_stream": "/chat/chat/stream",
+    "upload": "/docs/upload_doc",
+    "del_doc": "/docs/documents/{doc_id}",
+    "del_user": "/auth/users/{username}",
+}.items()}
+
+# Minimum seconds between re-renders of a streaming chat answer
+STREAM_RENDER_INTERVAL = 0.03
+# Seconds between UI refreshes while a long request runs in the background
+UI_POLL_INTERVAL = 0.1
+
 
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
 if "username" not in st.session_state:
     st.session_state.username = None
-if "auth_credentials" not in st.session_state:
-    st.session_state.auth_credentials = None
+if "access_token" not in st.session_state:
+    st.session_state.access_token = None
 if "role" not in st.session_state:
     st.session_state.role = None
 if "messages" not in st.session_state:
@@ -27,12 +48,82 @@ if "messages" not in st.session_state:
 if "persistent_session" not in st.session_state:
     st.session_state.persistent_session = False
 
+# HTTP SESSION (keep-alive + connection pooling against the backend)
+# Cached process-wide, so one pool of sockets is shared by every rerun and every
+# user session. Per-user auth therefore goes on each request, never on the session.
+@st.cache_resource(show_spinner=False)
+def get_http_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=32,
+        max_retries=Retry(total=2, backoff_factor=0.2)
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+SESSION = get_http_session()
+
+def auth_headers():
+    token = st.session_state.get("access_token")
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+def end_session_if_unauthorized(response):
+    """
+    Log the user out when the backend rejects their token (e.g. it expired), instead
+    of leaving every later call failing with a bare 401 while still "logged in".
+    Only applies when a token was sent, so a failed login is reported normally.
+    """
+    if response.status_code != 401 or not st.session_state.get("access_token"):
+        return
+    response.close()
+    st.session_state.clear()
+    st.session_state.session_expired = True
+    st.rerun()
+
+def api_request(method, url, headers=None, **kwargs):
+    response = SESSION.request(
+        method,
+        url,
+        headers={**auth_headers(), **(headers or {})},
+        **kwargs
+    )
+    end_session_if_unauthorized(response)
+    return response
+
+def api_get(url, **kwargs):
+    return api_request("GET", url, **kwargs)
+
+def api_post(url, **kwargs):
+    return api_request("POST", url, **kwargs)
+
+def api_delete(url, **kwargs):
+    return api_request("DELETE", url, **kwargs)
+
 # HELPER FUNCTIONS
 def get_first_param(value):
     if isinstance(value, list):
         return value[0] if value else None
     return value if value is not None else None
 
+class UploadReader:
+    """
+    Read-only view of a Streamlit UploadedFile for MultipartEncoder.
+    UploadedFile is a BytesIO, which the encoder would copy whole via getvalue();
+    exposing only read() and the remaining length makes it read in chunks instead.
+    """
+    def __init__(self, uploaded_file):
+        self._file = uploaded_file
+        self._file.seek(0)
+
+    @property
+    def len(self):
+        return self._file.size - self._file.tell()
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
 def display_message(role, content, ts=None):
     avatar = AVATAR_USER if role == "user" else AVATAR_AI
     with st.chat_message(role, avatar=avatar):
@@ -43,7 +134,7 @@ def display_message(role, content, ts=None):
 # AUTHENTICATION PAGES
 def verify_email(token: str):
     try:
-        r = requests.get(f"{API_BASE}/auth/verify-email?token={token}")
+        r = api_get(URLS["verify"], params={"token": token})
         r.raise_for_status()
         st.success(r.json().get("message", "Email verified successfully"))
         st.query_params.clear()
@@ -61,7 +152,7 @@ def reset_password_page(token: str):
                 st.error("Passwords do not match")
             else:
                 try:
-                    r = requests.post(f"{API_BASE}/auth/reset-password", json={
+                    r = api_post(URLS["reset"], json={
                         "token": token,
                         "new_password": npw,
                         "confirm_password": cpw
@@ -107,7 +198,7 @@ def signup():
                 data["team_lead_username"] = team_lead_username
 
             try:
-                r = requests.post(f"{API_BASE}/auth/signup", json=data)
+                r = api_post(URLS["signup"], json=data)
                 r.raise_for_status()
                 st.success("Account created. Please check your email to verify.")
             except Exception as e:
@@ -120,14 +211,13 @@ def login():
         password = st.text_input("Password", type="password", key="li_pass")
         if st.form_submit_button("Login"):
             try:
-                r = requests.post(f"{API_BASE}/auth/login", json={"username": username, "password": password})
+                r = api_post(URLS["login"], json={"username": username, "password": password})
                 r.raise_for_status()
                 data = r.json()
                 st.session_state.logged_in = True
                 st.session_state.username = username
-                st.session_state.auth_credentials = (username, password)
+                st.session_state.access_token = data["access_token"]
                 st.session_state.role = data["role"]
-                st.session_state.messages = []
                 st.session_state.persistent_session = True
                 st.rerun()
             except Exception as e:
@@ -139,7 +229,7 @@ def forgot_password():
         email = st.text_input("Email", key="fp_email")
         if st.form_submit_button("Send Reset Link"):
             try:
-                r = requests.post(f"{API_BASE}/auth/forgot-password", json={"email": email})
+                r = api_post(URLS["forgot"], json={"email": email})
                 r.raise_for_status()
                 st.success("If the email exists, a reset link has been sent.")
             except Exception as e:
@@ -166,10 +256,8 @@ def main_app():
             st.rerun()
 
         if st.button("Logout", type="primary"):
-            for key in list(st.session_state.keys()):
-                del st.session_state[key]
-            st.session_state.logged_in = False
-            st.session_state.persistent_session = False
+            # The init block at the top restores the defaults on the rerun
+            st.session_state.clear()
             st.rerun()
 
     tab_chat, tab_docs, tab_manage = st.tabs(["💬 Ask HR Questions", "📄 HR Document Center", "👥 Manage Users"])
@@ -199,29 +287,23 @@ def main_app():
                     placeholder.markdown("**Processing your query...**")
 
                     try:
-                        auth = HTTPBasicAuth(*st.session_state.auth_credentials)
-                        r = requests.post(
-                            f"{API_BASE}/chat/chat",
+                        parts = []
+                        last_render = time.monotonic()
+                        with api_post(
+                            URLS["chat_stream"],
                             data={"message": prompt},
-                            auth=auth,
-                            timeout=120
-                        )
-                        r.raise_for_status()
-                        data = r.json()
-
-                        answer = data.get("answer", "No information available in your accessible documents.")
-                        sources = data.get("sources", [])
-
-                        response_text = answer
-                        if sources:
-                            response_text += "\n\n**From Documents:**\n" + "\n".join(f"• {s}" for s in sources)
-
-                        typed = ""
-                        for char in response_text:
-                            typed += char
-                            placeholder.markdown(typed + "▌")
-                            time.sleep(0.012)
-
+                            timeout=120,
+                            stream=True
+                        ) as r:
+                            r.raise_for_status()
+                            r.encoding = "utf-8"
+                            for chunk in r.iter_content(chunk_size=None, decode_unicode=True):
+                                parts.append(chunk)
+                                if time.monotonic() - last_render > STREAM_RENDER_INTERVAL:
+                                    placeholder.markdown("".join(parts) + "▌")
+                                    last_render = time.monotonic()
+
+                        response_text = "".join(parts) or "No information available in your accessible documents."
                         placeholder.markdown(response_text)
 
                         st.session_state.messages.append({
@@ -251,29 +333,49 @@ def main_app():
                     progress_bar = st.progress(0)
                     status_text = st.empty()
 
-                    form_data = {"access_role": access_role}
-                    upload_files = [("files", (f.name, f.getvalue(), f.type)) for f in files]
+                    # Wrapped so the encoder reads each file in chunks instead of
+                    # making another full in-memory copy of it
+                    encoder = MultipartEncoder(
+                        fields=[("access_role", access_role)]
+                        + [("files", (f.name, UploadReader(f), f.type)) for f in files]
+                    )
+
+                    # The monitor callback runs on the upload thread, so it only records
+                    # progress; the script thread below does all the rendering.
+                    upload_state = {"bytes_read": 0}
+
+                    def on_upload_progress(monitor):
+                        upload_state["bytes_read"] = monitor.bytes_read
+
+                    monitor = MultipartEncoderMonitor(encoder, on_upload_progress)
 
                     try:
-                        auth = HTTPBasicAuth(*st.session_state.auth_credentials)
-
-                        for i in range(1, 101):
-                            time.sleep(0.03)
-                            progress_bar.progress(i)
-                            if i < 30:
-                                status_text.text("Preparing files...")
-                            elif i < 70:
-                                status_text.text("Uploading to server...")
-                            else:
-                                status_text.text("Indexing in knowledge base...")
-
-                        r = requests.post(
-                            f"{API_BASE}/docs/upload_doc",
-                            data=form_data,
-                            files=upload_files,
-                            auth=auth,
-                            timeout=300
-                        )
+                        status_text.text("Preparing files...")
+
+                        with ThreadPoolExecutor(max_workers=1) as pool:
+                            # Headers are built here: session_state is only
+                            # reachable from the script thread
+                            future = pool.submit(
+                                SESSION.post,
+                                URLS["upload"],
+                                data=monitor,
+                                headers={**auth_headers(), "Content-Type": monitor.content_type},
+                                timeout=300
+                            )
+                            started = time.monotonic()
+                            shown_percent = 0
+                            while not wait([future], timeout=UI_POLL_INTERVAL).done:
+                                percent = min(100, int(100 * upload_state["bytes_read"] / monitor.len))
+                                if percent != shown_percent:
+                                    shown_percent = percent
+                                    progress_bar.progress(percent)
+                                if percent < 100:
+                                    status_text.text(f"Uploading to server... {percent}%")
+                                else:
+                                    elapsed = int(time.monotonic() - started)
+                                    status_text.text(f"Indexing in knowledge base... ({elapsed}s)")
+                            r = future.result()
+                        end_session_if_unauthorized(r)
                         r.raise_for_status()
 
                         progress_bar.progress(100)
@@ -290,8 +392,7 @@ def main_app():
                     doc_id_del = st.text_input("Enter doc_id to delete")
                     if st.button("Delete Document Group") and doc_id_del:
                         try:
-                            auth = HTTPBasicAuth(*st.session_state.auth_credentials)
-                            r = requests.delete(f"{API_BASE}/docs/documents/{doc_id_del}", auth=auth)
+                            r = api_delete(URLS["del_doc"].format(doc_id=doc_id_del))
                             r.raise_for_status()
                             st.success(r.json()["message"])
                         except Exception as e:
@@ -303,8 +404,7 @@ def main_app():
             del_user = st.text_input("Username to delete")
             if st.button("Delete User") and del_user:
                 try:
-                    auth = HTTPBasicAuth(*st.session_state.auth_credentials)
-                    r = requests.delete(f"{API_BASE}/auth/users/{del_user}", auth=auth)
+                    r = api_delete(URLS["del_user"].format(username=del_user))
                     r.raise_for_status()
                     st.success(r.json()["message"])
                 except Exception as e:
@@ -328,6 +428,8 @@ else:
     if st.session_state.get("persistent_session", False) and st.session_state.get("logged_in", False):
         main_app()
     else:
+        if st.session_state.pop("session_expired", False):
+            st.warning("Session expired, please log in again.")
         tab_login, tab_signup, tab_forgot = st.tabs(["Login", "Sign Up", "Forgot Password"])
         with tab_login:
             login()
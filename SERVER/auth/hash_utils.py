@@ -10,30 +10,43 @@
 
 
 # filename: auth/hash_utils.py
+import os
+import asyncio
+import base64
+import re
 import bcrypt
 import hashlib
 
+# Legacy passlib "bcrypt_sha256" (v1) hashes: $bcrypt-sha256$<ident>,<rounds>$<salt>$<checksum>
+_BCRYPT_SHA256_V1 = re.compile(
+    r"^\$bcrypt-sha256\$(2[aby]),(\d{1,2})\$([./A-Za-z0-9]{22})\$([./A-Za-z0-9]{31})$"
+)
+
+# Cost factor for new hashes; existing hashes keep the rounds they were made with
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
 def hash_password(password: str) -> str:
     """Hash a plain text password"""
     password_bytes = password.encode('utf-8')
     sha256_hash = hashlib.sha256(password_bytes).digest()
-    return bcrypt.hashpw(sha256_hash, bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(sha256_hash, bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
     """Verify a plain text password against a hashed password"""
     if not password or not hashed:
         return False
-    password_bytes = password.encode('utf-8')
-    sha256_hash = hashlib.sha256(password_bytes).digest()
-    if hashed.startswith('$bcrypt-sha256$'):
-        parts = hashed.split('$')
-        if len(parts) != 5:
-            return False
-        type_rounds = parts[2].split(',')
-        if len(type_rounds) != 2:
-            return False
-        type_, rounds = type_rounds
-        inner_hash = f'${type_}${rounds}${parts[3]}${parts[4]}'.encode('utf-8')
-        return bcrypt.checkpw(sha256_hash, inner_hash)
-    else:
-        return bcrypt.checkpw(sha256_hash, hashed.encode('utf-8'))
\ No newline at end of file
+    sha256_hash = hashlib.sha256(password.encode('utf-8')).digest()
+    if not hashed.startswith('$bcrypt-sha256$'):
+        return bcrypt.checkpw(sha256_hash, hashed.encode('utf-8'))
+
+    match = _BCRYPT_SHA256_V1.match(hashed)
+    if not match:
+        return False
+    ident, rounds, salt, checksum = match.groups()
+    inner_hash = f'${ident}${int(rounds):02d}${salt}{checksum}'.encode('utf-8')
+    # passlib v1 feeds bcrypt the base64 of the digest, not the raw bytes
+    return bcrypt.checkpw(base64.b64encode(sha256_hash), inner_hash)
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    """verify_password on a worker thread, so bcrypt never blocks the event loop"""
+    return await asyncio.to_thread(verify_password, password, hashed)
\ No newline at end of file
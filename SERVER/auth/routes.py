@@ -1,30 +1,110 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, status, BackgroundTasks, Depends
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from .models import SignUpRequest, LoginRequest, ForgotPasswordRequest, ResetPasswordRequest
-from .hash_utils import hash_password, verify_password
+from .hash_utils import hash_password, verify_password_async
 from config.db import users_collection
-from utils.email_utils import generate_token, verify_token, send_email, SALT_EMAIL, SALT_RESET
+from pymongo.errors import DuplicateKeyError
+from utils.email_utils import generate_token, verify_token, send_email, SALT_EMAIL, SALT_RESET, SECRET_KEY
 from typing import Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from cachetools import TTLCache
+import hashlib
+import os
+import time
+import jwt
 
 router = APIRouter()
-security = HTTPBasic()
+security = HTTPBearer()
+
+JWT_ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+
+# Recently verified logins: (username, password fingerprint) -> user info.
+# Cleared whenever a password changes or a user is deleted.
+_USER_CACHE = TTLCache(maxsize=1024, ttl=30)
+
+# Bearer token -> (current user, token expiry), so steady chat traffic skips
+# the JWT decode and the Mongo lookup
+_TOKEN_CACHE = TTLCache(maxsize=10_000, ttl=300)
+
+def _credentials_key(username: str, password: str) -> tuple:
+    fingerprint = hashlib.blake2b(
+        password.encode("utf-8"),
+        digest_size=16,
+        key=SECRET_KEY.encode("utf-8")[:64]
+    ).digest()
+    return (username, fingerprint)
 
 async def authenticate(username: str, password: str) -> Dict[str, Any]:
+    cache_key = _credentials_key(username, password)
+    cached = _USER_CACHE.get(cache_key)
+    if cached:
+        return cached
+
     user = await users_collection.find_one({"username": username})
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-    if not verify_password(password, user.get("password", "")):
+    if not await verify_password_async(password, user.get("password", "")):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
     if not user.get("is_verified", False):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Email not verified")
-    return {
+    verified_user = {
         "username": user["username"],
         "role": user.get("role", "Employee")
     }
+    _USER_CACHE[cache_key] = verified_user
+    return verified_user
+
+def create_access_token(user: Dict[str, Any]) -> str:
+    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    payload = {"sub": user["username"], "role": user["role"], "exp": expire}
+    return jwt.encode(payload, SECRET_KEY, algorithm=JWT_ALGORITHM)
 
-async def get_current_user(credentials: HTTPBasicCredentials = Depends(security)):
-    return await authenticate(credentials.username, credentials.password)
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    token = credentials.credentials
+    cached = _TOKEN_CACHE.get(token)
+    if cached and cached[1] > time.time():
+        return cached[0]
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Session expired, please login again",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    except jwt.InvalidTokenError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+    # Confirm the account still exists, so deleted users lose access
+    user = await users_collection.find_one(
+        {"username": payload["sub"]},
+        {"username": 1, "role": 1, "is_verified": 1}
+    )
+    if not user or not user.get("is_verified", False):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+    current_user = {
+        "username": user["username"],
+        "role": user.get("role", "Employee")
+    }
+    _TOKEN_CACHE[token] = (current_user, payload["exp"])
+    return current_user
+
+def _forget_user_tokens(username: str) -> None:
+    for token, (user, _) in list(_TOKEN_CACHE.items()):
+        if user["username"] == username:
+            _TOKEN_CACHE.pop(token, None)
 
 def get_verification_link(email: str):
     token = generate_token(email, SALT_EMAIL)
@@ -37,29 +117,45 @@ def get_reset_link(email: str):
 @router.post("/login")
 async def login(req: LoginRequest):
     user = await authenticate(req.username, req.password)
-    return {"message": f"Welcome {user['username']}", "role": user["role"]}
+    return {
+        "message": f"Welcome {user['username']}",
+        "role": user["role"],
+        "access_token": create_access_token(user),
+        "token_type": "bearer"
+    }
 
 @router.post("/signup", status_code=status.HTTP_201_CREATED)
 async def signup(req: SignUpRequest, background_tasks: BackgroundTasks):
-    existing_user = await users_collection.find_one(
-        {"$or": [{"username": req.username}, {"email": req.email}]}
-    )
+    # Only the lookups relevant to the requested role are issued, all at once
+    lookups = {
+        "existing_user": users_collection.find_one(
+            {"$or": [{"username": req.username}, {"email": req.email}]}
+        )
+    }
+    if req.role == "HR Manager":
+        lookups["hr_manager"] = users_collection.find_one({"role": "HR Manager"})
+    if req.role == "Team Lead":
+        lookups["team_lead_count"] = users_collection.count_documents({"role": "Team Lead"})
+    if req.role == "Employee" and req.team_lead_username:
+        lookups["team_lead"] = users_collection.find_one(
+            {"username": req.team_lead_username, "role": "Team Lead"}
+        )
+    results = dict(zip(lookups, await asyncio.gather(*lookups.values())))
+    existing_user = results["existing_user"]
+
     if existing_user:
         if existing_user.get("username") == req.username:
             raise HTTPException(status_code=400, detail=f'Username "{req.username}" already exists')
         else:
             raise HTTPException(status_code=400, detail=f'Email "{req.email}" already exists')
 
-    if req.role == "HR Manager":
-        if await users_collection.find_one({"role": "HR Manager"}):
-            raise HTTPException(status_code=400, detail="Only one HR Manager is allowed")
+    if results.get("hr_manager"):
+        raise HTTPException(status_code=400, detail="Only one HR Manager is allowed")
 
-    if req.role == "Team Lead":
-        count = await users_collection.count_documents({"role": "Team Lead"})
-        if count >= 4:
-            raise HTTPException(status_code=400, detail="Maximum 4 Team Leads allowed")
+    if results.get("team_lead_count", 0) >= 4:
+        raise HTTPException(status_code=400, detail="Maximum 4 Team Leads allowed")
 
-    hashed_pwd = hash_password(req.password)
+    hashed_pwd = await asyncio.to_thread(hash_password, req.password)
     user_data = {
         "email": req.email,
         "username": req.username,
@@ -73,17 +169,18 @@ async def signup(req: SignUpRequest, background_tasks: BackgroundTasks):
     if req.role == "Employee":
         if not req.team_lead_username:
             raise HTTPException(status_code=400, detail="Employee must have a team_lead_username")
-        
-        team_lead = await users_collection.find_one({
-            "username": req.team_lead_username,
-            "role": "Team Lead"
-        })
-        if not team_lead:
+        if not results.get("team_lead"):
             raise HTTPException(status_code=400, detail="Invalid or non-existent Team Lead username")
         
         user_data["team_lead"] = req.team_lead_username
 
-    await users_collection.insert_one(user_data)
+    # The unique indexes are the race-free check for concurrent signups
+    try:
+        await users_collection.insert_one(user_data)
+    except DuplicateKeyError as e:
+        if "username" in (e.details or {}).get("keyPattern", {}):
+            raise HTTPException(status_code=400, detail=f'Username "{req.username}" already exists')
+        raise HTTPException(status_code=400, detail=f'Email "{req.email}" already exists')
 
     background_tasks.add_task(
         send_email,
@@ -131,7 +228,7 @@ async def reset_password(req: ResetPasswordRequest):
     if not email:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
 
-    hashed_pwd = hash_password(req.new_password)
+    hashed_pwd = await asyncio.to_thread(hash_password, req.new_password)
     result = await users_collection.update_one(
         {"email": email},
         {"$set": {"password": hashed_pwd}}
@@ -139,6 +236,7 @@ async def reset_password(req: ResetPasswordRequest):
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
 
+    _USER_CACHE.clear()
     return {"message": "Password updated successfully"}
 
 @router.delete("/users/{username}")
@@ -163,4 +261,7 @@ async def delete_user(
     if result.deleted_count == 0:
         raise HTTPException(status_code=500, detail="Delete failed")
 
+    _USER_CACHE.clear()
+    _forget_user_tokens(username)
+
     return {"message": f"User '{username}' deleted successfully"}
\ No newline at end of file
@@ -1,5 +1,8 @@
 import os
+import asyncio
+import logging
 from datetime import datetime
+from functools import lru_cache
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
@@ -16,27 +19,28 @@ SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
 SALT_EMAIL = "email-confirm"
 SALT_RESET = "password-reset"
 
+logger = logging.getLogger(__name__)
+
 # ---------------- TOKEN ----------------
+_SERIALIZER = URLSafeTimedSerializer(SECRET_KEY)
+
 def generate_token(email: str, salt: str) -> str:
-    serializer = URLSafeTimedSerializer(SECRET_KEY)
-    return serializer.dumps(email, salt=salt)
+    return _SERIALIZER.dumps(email, salt=salt)
 
 def verify_token(token: str, salt: str, expiration: int = 3600) -> str | None:
-    serializer = URLSafeTimedSerializer(SECRET_KEY)
     try:
-        email = serializer.loads(token, salt=salt, max_age=expiration)
+        email = _SERIALIZER.loads(token, salt=salt, max_age=expiration)
         return email
     except SignatureExpired:
-        print("Token expired")
+        logger.warning("Token expired")
         return None
     except BadSignature:
-        print("Invalid token")
+        logger.warning("Invalid token")
         return None
 
 # ---------------- HTML EMAIL ----------------
-def create_email_html(subject: str, main_text: str) -> str:
-    year = datetime.now().year
-    html_content = f"""
+# Static parts of the template, built once; only the body text and year vary.
+_EMAIL_HEAD = """
 <html>
   <body style="font-family: Arial, sans-serif; background-color: #f4f9ff; margin: 0; padding: 0;">
     <table width="100%" style="max-width: 600px; margin: 40px auto; background-color: white; border-radius: 10px; box-shadow: 0 2px 8px rgba(0,0,0,0.1);">
@@ -51,7 +55,9 @@ def create_email_html(subject: str, main_text: str) -> str:
         <td style="padding: 30px; color: #333; text-align: left;">
           <p style="font-size: 16px;">Dear User,</p>
           <p style="font-size: 16px; line-height: 1.6;">
-            {main_text}
+            """
+
+_EMAIL_TAIL = """
           </p>
           <p style="margin-top: 30px; font-size: 15px;">
             Best Regards,<br>
@@ -71,7 +77,40 @@ def create_email_html(subject: str, main_text: str) -> str:
   </body>
 </html>
 """
-    return html_content
+
+@lru_cache(maxsize=2)
+def _email_tail(year: int) -> str:
+    return _EMAIL_TAIL.format(year=year)
+
+def create_email_html(subject: str, main_text: str) -> str:
+    return _EMAIL_HEAD + main_text + _email_tail(datetime.now().year)
+
+# ---------------- SMTP CONNECTION ----------------
+# One authenticated connection is kept open and reused across sends;
+# it is re-established lazily when the server drops it.
+_smtp: aiosmtplib.SMTP | None = None
+_smtp_lock = asyncio.Lock()
+
+async def _get_smtp() -> aiosmtplib.SMTP:
+    global _smtp
+    if _smtp is None or not _smtp.is_connected:
+        smtp = aiosmtplib.SMTP(hostname=SMTP_SERVER, port=SMTP_PORT, start_tls=True)
+        await smtp.connect()
+        await smtp.login(SENDER_EMAIL, SENDER_PASSWORD)
+        _smtp = smtp
+    return _smtp
+
+async def _send_message(msg: MIMEMultipart) -> None:
+    global _smtp
+    async with _smtp_lock:
+        try:
+            smtp = await _get_smtp()
+            await smtp.send_message(msg)
+        except aiosmtplib.SMTPServerDisconnected:
+            # Idle connection was closed by the server; reconnect once and retry
+            _smtp = None
+            smtp = await _get_smtp()
+            await smtp.send_message(msg)
 
 # ---------------- SEND EMAIL ----------------
 async def send_email(
@@ -110,14 +149,7 @@ async def send_email(
 
     # Send email asynchronously
     try:
-        await aiosmtplib.send(
-            msg,
-            hostname=SMTP_SERVER,
-            port=SMTP_PORT,
-            start_tls=True,
-            username=SENDER_EMAIL,
-            password=SENDER_PASSWORD
-        )
+        await _send_message(msg)
         print(f"[INFO] Email sent to {to_email} successfully.")
     except Exception as e:
         print(f"[ERROR] Failed to send email to {to_email}: {e}")
\ No newline at end of file
@@ -1,15 +1,25 @@
 # filename: rag/query.py
 import os
 import asyncio
-from typing import Dict, List
+import logging
+import hashlib
+from array import array
+from collections import defaultdict
+from typing import AsyncIterator, Dict, List, Tuple
 from dotenv import load_dotenv
+from cachetools import TTLCache
 
-from pinecone import Pinecone
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_core.prompts import PromptTemplate
+from langchain_openai import ChatOpenAI
+
+from config.db import chunks_collection
+from config.vectordb import index
+from config.embeddings import http_async_client
+from chat.embed_batcher import batcher
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Environment Validation
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
@@ -27,16 +37,11 @@ if missing:
 
 os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 
-# Initialize Clients
-pc = Pinecone(api_key=PINECONE_API_KEY)
-index = pc.Index(PINECONE_INDEX_NAME)
-
-embed_model = OpenAIEmbeddings(model="text-embedding-3-small")
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.3)
+# Initialize Clients (the HTTP client is shared with ingestion)
+llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.3, http_async_client=http_async_client)
 
 # Updated HR-Focused RAG Prompt
-prompt = PromptTemplate.from_template(
-    """
+PROMPT_TEMPLATE = """
 You are a professional, helpful, and confidential HR assistant for our company.
 Your role is to answer questions based **only** on the HR documents and policies provided in the context below.
 
@@ -56,10 +61,111 @@ Relevant HR Context (only documents you have access to):
 
 Answer:
 """
-)
 
-# Create the RAG chain
-rag_chain = prompt | llm
+# The template is fixed, so split it once around its two slots and build each
+# prompt by plain concatenation instead of re-formatting through a chain
+_PROMPT_HEAD, _PROMPT_REST = PROMPT_TEMPLATE.split("{question}")
+_PROMPT_MID, _PROMPT_TAIL = _PROMPT_REST.split("{context}")
+
+def render_prompt(question: str, context: str) -> str:
+    return f"{_PROMPT_HEAD}{question}{_PROMPT_MID}{context}{_PROMPT_TAIL}"
+
+NO_ACCESS_ANSWER = "I'm sorry, I don't have access to that information or it's not covered in the available HR documents."
+ERROR_ANSWER = "Sorry, something went wrong while processing your HR query. Please try again later."
+
+# The JSON endpoint also returns sources as a separate field; set to "false" to keep
+# them out of its answer text. The stream always ends with them (it has no other channel).
+APPEND_SOURCES_TO_ANSWER = os.getenv("APPEND_SOURCES_TO_ANSWER", "true").lower() == "true"
+
+# Upper bound on retrieved text sent to the LLM (~5 chunks of 500 tokens)
+MAX_CONTEXT_CHARS = 12000
+
+# Query embeddings keyed by normalized question text; HR questions repeat a lot
+_embedding_cache = TTLCache(maxsize=2048, ttl=3600)
+
+async def embed_query_cached(query: str) -> List[float]:
+    key = " ".join(query.lower().split())
+    embedding = _embedding_cache.get(key)
+    if embedding is None:
+        embedding = await batcher.embed(query)
+        _embedding_cache[key] = embedding
+    return embedding
+
+# Pinecone matches keyed by (role, namespace epoch, embedding fingerprint).
+# Bumping a role's epoch after an upload makes its old entries unreachable.
+_query_cache = TTLCache(maxsize=4096, ttl=600)
+_namespace_epoch = defaultdict(int)
+
+def invalidate_role_cache(role: str) -> None:
+    """Drop cached search results for a namespace after its vectors change."""
+    _namespace_epoch[role] += 1
+
+async def query_index_cached(embedding: List[float], user_role: str) -> list:
+    fingerprint = hashlib.blake2b(array("f", embedding).tobytes(), digest_size=16).digest()
+    key = (user_role, _namespace_epoch[user_role], fingerprint)
+    matches = _query_cache.get(key)
+    if matches is None:
+        results = await asyncio.to_thread(
+            index.query,
+            vector=embedding,
+            top_k=5,
+            include_metadata=True,
+            namespace=user_role   # Critical: role-based access control
+        )
+        matches = results.get("matches", [])
+        # Don't cache misses, so a role's first upload shows up right away
+        if matches:
+            _query_cache[key] = matches
+    return matches
+
+async def retrieve_context(query: str, user_role: str) -> Tuple[str, List[str]]:
+    """
+    Embed the query and fetch matching chunks from the user's role namespace.
+
+    Returns:
+        tuple: (context, sources) — context is empty when nothing relevant was found
+    """
+    # 1. Generate query embedding (cached for repeated questions)
+    embedding = await embed_query_cached(query)
+
+    # 2. Query Pinecone - filter by user's role namespace (cached per role + vector)
+    matches = await query_index_cached(embedding, user_role)
+    if not matches:
+        return "", []
+
+    # 3. Fetch chunk text from Mongo in one round-trip
+    chunk_texts = {
+        doc["_id"]: doc["text"]
+        async for doc in chunks_collection.find(
+            {"_id": {"$in": [match["id"] for match in matches]}},
+            {"text": 1}
+        )
+    }
+
+    # 4. Extract context and sources, skipping repeated chunks (e.g. boilerplate)
+    # and stopping once the context budget is used up
+    context_parts = []
+    seen_chunks = set()
+    context_chars = 0
+    sources = set()
+
+    for match in matches:
+        metadata = match["metadata"]
+        # Vectors indexed before chunk text moved to Mongo still carry it in metadata
+        text_chunk = (chunk_texts.get(match["id"]) or metadata.get("text", "")).strip()
+        source = metadata.get("source", "Unknown document")
+
+        if not text_chunk or text_chunk in seen_chunks:
+            continue
+        if context_parts and context_chars + len(text_chunk) > MAX_CONTEXT_CHARS:
+            break
+
+        seen_chunks.add(text_chunk)
+        context_parts.append(text_chunk)
+        context_chars += len(text_chunk)
+        sources.add(source)
+
+    return "\n\n".join(context_parts), sorted(sources)
 
 # Role-Filtered RAG Query (unchanged logic, updated messages)
 async def answer_query(query: str, user_role: str) -> Dict[str, any]:
@@ -75,67 +181,57 @@ async def answer_query(query: str, user_role: str) -> Dict[str, any]:
         dict: {"answer": str, "sources": list[str]}
     """
     try:
-        # 1. Generate query embedding
-        embedding = await asyncio.to_thread(embed_model.embed_query, query)
+        context, sources = await retrieve_context(query, user_role)
 
-        # 2. Query Pinecone - filter by user's role namespace
-        results = await asyncio.to_thread(
-            index.query,
-            vector=embedding,
-            top_k=5,
-            include_metadata=True,
-            namespace=user_role   # Critical: role-based access control
-        )
-
-        matches = results.get("matches", [])
-
-        if not matches:
-            return {
-                "answer": "I'm sorry, I don't have access to that information or it's not covered in the available HR documents.",
-                "sources": []
-            }
-
-        # 3. Extract context and sources
-        context_parts = []
-        sources = set()
-
-        for match in matches:
-            metadata = match["metadata"]
-            text_chunk = metadata.get("text", "")
-            source = metadata.get("source", "Unknown document")
-
-            if text_chunk.strip():
-                context_parts.append(text_chunk.strip())
-                sources.add(source)
-
-        if not context_parts:
+        if not context:
             return {
-                "answer": "I'm sorry, I don't have access to that information or it's not covered in the available HR documents.",
+                "answer": NO_ACCESS_ANSWER,
                 "sources": []
             }
 
-        context = "\n\n".join(context_parts)
-
-        # 4. Generate answer using LLM
-        response = await asyncio.to_thread(
-            rag_chain.invoke,
-            {"question": query, "context": context}
-        )
+        # 5. Generate answer using LLM
+        response = await llm.ainvoke(render_prompt(query, context))
 
         final_answer = response.content.strip()
 
-        # 5. Append sources if any
-        if sources:
-            final_answer += f"\n\n**Sources:** {', '.join(sorted(sources))}"
+        # 6. Append sources if any (retrieve_context already returns them sorted)
+        if sources and APPEND_SOURCES_TO_ANSWER:
+            final_answer += f"\n\n**Sources:** {', '.join(sources)}"
 
         return {
             "answer": final_answer,
-            "sources": list(sorted(sources))
+            "sources": sources
         }
 
-    except Exception as e:
-        print(f"Error in HR RAG query for role '{user_role}': {str(e)}")
+    except Exception:
+        logger.exception(f"Error in HR RAG query for role '{user_role}'")
         return {
-            "answer": "Sorry, something went wrong while processing your HR query. Please try again later.",
+            "answer": ERROR_ANSWER,
             "sources": []
-        }
\ No newline at end of file
+        }
+
+async def stream_answer(query: str, user_role: str) -> AsyncIterator[str]:
+    """
+    Streaming variant of answer_query.
+    Yields answer text as the LLM produces it, followed by the sources line.
+    If it fails mid-answer, the error message is set apart from the partial text.
+    """
+    answered = False
+    try:
+        context, sources = await retrieve_context(query, user_role)
+
+        if not context:
+            yield NO_ACCESS_ANSWER
+            return
+
+        async for chunk in llm.astream(render_prompt(query, context)):
+            if chunk.content:
+                answered = True
+                yield chunk.content
+
+        if sources:
+            yield f"\n\n**Sources:** {', '.join(sources)}"
+
+    except Exception:
+        logger.exception(f"Error in HR RAG stream for role '{user_role}'")
+        yield f"\n\n{ERROR_ANSWER}" if answered else ERROR_ANSWER
@@ -0,0 +1,73 @@
+# filename: chat/embed_batcher.py
+import asyncio
+import logging
+from typing import List, Optional, Set, Tuple
+
+from config.embeddings import embed_model
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = 16      # queries per embeddings request
+MAX_DELAY = 0.01    # seconds to wait for more queries after the first one arrives
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces query embeddings that arrive within MAX_DELAY of each other into a
+    single aembed_documents call, so concurrent /chat requests share one round-trip.
+    """
+
+    def __init__(self, max_batch: int = MAX_BATCH, max_delay: float = MAX_DELAY):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # The loop only holds weak references to tasks; keep in-flight batches alive
+        self._inflight: Set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> List[float]:
+        if self._worker is None or self._worker.done():
+            # Started lazily so the queue and task belong to the running loop
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Don't hold up the next window while this batch is in flight
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            embeddings = await embed_model.aembed_documents([text for text, _ in batch])
+        except Exception as e:
+            logger.error(f"Batched embedding of {len(batch)} queries failed: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+
+
+batcher = EmbeddingBatcher()
@@ -1,10 +1,11 @@
 import logging
 from fastapi import APIRouter, Depends, Form, HTTPException, status
+from fastapi.responses import StreamingResponse
 from typing import Dict, Any
 from datetime import datetime
 
 from auth.routes import get_current_user
-from .chat_query import answer_query   
+from .chat_query import answer_query, stream_answer
 from .models import ChatResponse
 
 logger = logging.getLogger(__name__)
@@ -67,4 +68,40 @@ async def hr_chat(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Sorry, we couldn't process your HR question right now. Please try again later."
-        )
\ No newline at end of file
+        )
+
+@router.post(
+    "/stream",
+    summary="Ask HR Questions (streaming)",
+    description="Same as the chat endpoint, but streams the answer as plain text while it is generated. Sources are appended at the end."
+)
+async def hr_chat_stream(
+    message: str = Form(
+        ...,
+        min_length=1,
+        max_length=2000,
+        description="Your HR-related question or request"
+    ),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> StreamingResponse:
+    """
+    Streaming HR Assistant endpoint with strict role-based document access.
+    """
+    cleaned_message = message.strip()
+    if not cleaned_message:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Please enter a valid question"
+        )
+
+    username = current_user.get("username", "unknown")
+    user_role = current_user.get("role", "unknown")
+
+    logger.info(
+        f"HR chat stream request - user: {username} | role: {user_role} | query: {cleaned_message[:100]}..."
+    )
+
+    return StreamingResponse(
+        stream_answer(query=cleaned_message, user_role=user_role),
+        media_type="text/plain; charset=utf-8"
+    )
@@ -1,7 +1,9 @@
 # filename: config/db.py
 import os
+import logging
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.server_api import ServerApi
 
 load_dotenv()
 
@@ -10,8 +12,31 @@ DB_NAME = os.getenv("DB_NAME", "hr_chatbot")
 
 client = AsyncIOMotorClient(
     MONGO_URI,
-    serverSelectionTimeoutMS=5000
+    maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+    minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", "5")),
+    serverSelectionTimeoutMS=5000,
+    server_api=ServerApi("1")
 )
 
 db = client[DB_NAME]
 users_collection = db["users"]
+chunks_collection = db["chunks"]   # chunk text, keyed by Pinecone vector id
+
+logger = logging.getLogger(__name__)
+
+async def ping_db():
+    """Open the connection pool eagerly so the first real request doesn't pay for it."""
+    try:
+        await client.admin.command("ping")
+    except Exception as e:
+        logger.error(f"MongoDB ping failed: {str(e)}")
+
+async def create_indexes():
+    """Create the indexes the auth and document flows rely on (no-op if they already exist)."""
+    try:
+        await users_collection.create_index("username", unique=True)
+        await users_collection.create_index("email", unique=True)
+        await users_collection.create_index("role")
+        await chunks_collection.create_index("doc_id")
+    except Exception as e:
+        logger.error(f"Failed to create MongoDB indexes: {str(e)}")
@@ -0,0 +1,25 @@
+# filename: config/embeddings.py
+import os
+import httpx
+from dotenv import load_dotenv
+from langchain_openai import OpenAIEmbeddings
+
+load_dotenv()
+
+# One pooled async client for every OpenAI call in the process (embeddings and chat),
+# so uploads and queries reuse warm HTTP/2 connections instead of opening new ones
+http_async_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+)
+
+# text-embedding-3-small can return shortened vectors (e.g. 512 or 768) with little
+# recall loss; smaller vectors mean less to store, transfer and scan in Pinecone.
+# Changing this needs a fresh index, since an index's dimension is fixed.
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+
+embed_model = OpenAIEmbeddings(
+    model="text-embedding-3-small",
+    dimensions=EMBEDDING_DIMENSIONS,
+    http_async_client=http_async_client
+)
@@ -0,0 +1,55 @@
+# filename: config/vectordb.py
+import os
+import time
+from dotenv import load_dotenv
+from pinecone import ServerlessSpec
+from pinecone.exceptions import PineconeApiException
+from pinecone.grpc import PineconeGRPC as Pinecone
+
+from config.embeddings import EMBEDDING_DIMENSIONS
+
+load_dotenv()
+
+PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
+
+required = {
+    "PINECONE_API_KEY": PINECONE_API_KEY,
+    "PINECONE_INDEX_NAME": PINECONE_INDEX_NAME
+}
+missing = [k for k, v in required.items() if not v]
+if missing:
+    raise ValueError(f"Missing required environment variables: {', '.join(missing)}")
+
+# Single gRPC client shared by ingestion and chat; queries and upserts are
+# multiplexed over one HTTP/2 channel instead of separate REST connections
+pc = Pinecone(api_key=PINECONE_API_KEY)
+
+if PINECONE_INDEX_NAME not in pc.list_indexes().names():
+    print(f"Creating Pinecone serverless index: {PINECONE_INDEX_NAME}")
+    try:
+        pc.create_index(
+            name=PINECONE_INDEX_NAME,
+            dimension=EMBEDDING_DIMENSIONS,   # must match embed_model
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1")
+        )
+    except PineconeApiException as e:
+        # Another replica or container starting at the same time created it first
+        if e.status != 409:
+            raise
+    print("Waiting for index to be ready...")
+    while not pc.describe_index(PINECONE_INDEX_NAME).status["ready"]:
+        time.sleep(2)
+
+index = pc.Index(PINECONE_INDEX_NAME)
+
+# An existing index keeps the dimension it was created with; fail fast rather
+# than have every upsert rejected while uploads still report success
+index_dimension = pc.describe_index(PINECONE_INDEX_NAME).dimension
+if index_dimension != EMBEDDING_DIMENSIONS:
+    raise ValueError(
+        f"Pinecone index '{PINECONE_INDEX_NAME}' has dimension {index_dimension}, "
+        f"but EMBEDDING_DIMENSIONS is {EMBEDDING_DIMENSIONS}"
+    )
+print(f"Pinecone index '{PINECONE_INDEX_NAME}' connected successfully.")
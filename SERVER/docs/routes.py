@@ -4,6 +4,7 @@ import uuid
 import logging
 from datetime import datetime
 from auth.routes import get_current_user
+from chat.chat_query import invalidate_role_cache
 from .vectorstore import load_vectorstore_async
 
 logger = logging.getLogger(__name__)
@@ -41,6 +42,7 @@ async def upload_hr_documents(
             doc_id=doc_id
         )
 
+        invalidate_role_cache(access_role)
         logger.info(f"Upload success - doc_id: {doc_id}")
 
         return {
@@ -1,20 +1,28 @@
 # filename: docs/vectorstore.py
 import os
-import time
 import asyncio
+import logging
+import hashlib
+import tempfile
+import time
 from pathlib import Path
-from typing import List
+from typing import Callable, List
 from dotenv import load_dotenv
-from tqdm.auto import tqdm
-from pinecone import Pinecone, ServerlessSpec
 from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
 import aiofiles
+import orjson
+import aiofiles.os
 from fastapi import UploadFile
+from config.db import chunks_collection
+from config.vectordb import index
+from config.embeddings import embed_model
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Environment Variables Validation
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
@@ -34,90 +42,171 @@ os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 # Constants & Setup
 UPLOAD_DIR = Path("./upload_docs")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+PDF_CACHE_DIR = UPLOAD_DIR / "cache"   # parsed pages keyed by file content hash
+PDF_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(512 << 20)))   # 512 MiB
+PDF_CACHE_MAX_AGE = int(os.getenv("PDF_CACHE_MAX_AGE_DAYS", "30")) * 86400    # seconds since last use
+DOC_CONCURRENCY = int(os.getenv("DOC_CONCURRENCY", "4"))   # files ingested in parallel
+EMBED_BATCH_SIZE = 512   # texts per embeddings request (API accepts up to 2048)
+UPSERT_CONCURRENCY = 8   # Pinecone upsert batches in flight per file
+SAVE_CHUNK_SIZE = 1 << 20   # 1 MiB per read when saving uploads
 
-# Initialize Pinecone
-pc = Pinecone(api_key=PINECONE_API_KEY)
+# Token-aware splitter, shared by every upload. Chunk sizes are measured in
+# tokens of the embedding model's encoding rather than characters.
+text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+    encoding_name="cl100k_base",   # text-embedding-3-small
+    chunk_size=500,
+    chunk_overlap=50,
+    add_start_index=True
+)
 
-if PINECONE_INDEX_NAME not in pc.list_indexes().names():
-    print(f"Creating Pinecone serverless index: {PINECONE_INDEX_NAME}")
-    pc.create_index(
-        name=PINECONE_INDEX_NAME,
-        dimension=1536,           # text-embedding-3-small
-        metric="cosine",
-        spec=ServerlessSpec(cloud="aws", region="us-east-1")
-    )
-    print("Waiting for index to be ready...")
-    while not pc.describe_index(PINECONE_INDEX_NAME).status["ready"]:
-        time.sleep(2)
+# Progress Reporting
+def _progress_logger(label: str, total: int) -> Callable[[int], None]:
+    """
+    Return an update(n) callback that logs progress roughly every 5% of total,
+    instead of redrawing a progress bar on every batch.
+    """
+    step = max(1, total // 20)
+    done = 0
+    next_report = step
 
-index = pc.Index(PINECONE_INDEX_NAME)
-print(f"Pinecone index '{PINECONE_INDEX_NAME}' connected successfully.")
+    def update(n: int) -> None:
+        nonlocal done, next_report
+        done += n
+        if done >= next_report or done == total:
+            logger.info(f"{label}: {done}/{total}")
+            next_report = (done // step + 1) * step
+
+    return update
 
 # Async File Save Helper
-async def save_uploaded_file_async(file: UploadFile, save_path: Path):
-    """Save uploaded file asynchronously to disk"""
-    content = await file.read()
+async def save_uploaded_file_async(file: UploadFile, save_path: Path) -> str:
+    """
+    Save uploaded file asynchronously to disk, streaming it in chunks.
+    Returns a hex digest of the file contents, computed while writing.
+    """
+    digest = hashlib.blake2b(digest_size=16)
     async with aiofiles.open(save_path, 'wb') as f:
-        await f.write(content)
-    print(f"File saved to disk: {save_path}")
+        while chunk := await file.read(SAVE_CHUNK_SIZE):
+            digest.update(chunk)
+            await f.write(chunk)
+    logger.info(f"File saved to disk: {save_path}")
+    return digest.hexdigest()
 
-# Main Async Ingestion Function
-async def load_vectorstore_async(
-    uploaded_files: List[UploadFile],
-    role: str,
-    doc_id: str
-) -> None:
+# Parsed-PDF Cache
+def load_documents_cached(save_path: Path, file_hash: str) -> List[Document]:
     """
-    Async document ingestion pipeline with progress tracking.
-    - Saves uploaded files temporarily
-    - Loads, splits, embeds, and upserts to Pinecone
-    - Uses role as namespace for access control
+    Load a PDF, reusing the parsed pages from a previous upload of identical bytes.
+    Runs in an executor: both pypdf parsing and the cache file I/O are blocking.
     """
-    valid_roles = ["Employee", "Team Lead", "HR Executive", "HR Manager"]
-    if role not in valid_roles:
-        raise ValueError(f"Invalid role: {role}. Must be one of {valid_roles}")
+    # Stored as plain JSON (page_content + metadata), never pickle: the cache
+    # directory is a host bind mount, so its contents can't be trusted as code
+    cache_path = PDF_CACHE_DIR / f"{file_hash}.json"
+    try:
+        documents = [Document(**doc) for doc in orjson.loads(cache_path.read_bytes())]
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # Corrupt, truncated or stale entry: re-parse and overwrite it below
+        logger.warning(f"Ignoring unreadable PDF cache entry {cache_path.name}: {str(e)}")
+    else:
+        try:
+            os.utime(cache_path)   # mark as recently used for pruning
+        except OSError:
+            pass
+        return documents
 
-    embed_model = OpenAIEmbeddings(model="text-embedding-3-small")
-    loop = asyncio.get_running_loop()
+    documents = PyPDFLoader(str(save_path)).load()
+    if documents:
+        # Write to a temp file and rename, so concurrent readers (other files in
+        # the batch, other replicas) never see a partially written file
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(dir=PDF_CACHE_DIR, suffix=".tmp", delete=False) as tmp:
+                tmp_path = tmp.name
+                tmp.write(orjson.dumps(
+                    [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in documents]
+                ))
+            os.replace(tmp_path, cache_path)
+            prune_pdf_cache()
+        except (OSError, TypeError) as e:
+            # The cache is only an optimisation; a full disk (or metadata orjson
+            # can't encode) mustn't fail the upload
+            logger.warning(f"Could not cache parsed pages for {save_path.name}: {str(e)}")
+            if tmp_path:
+                Path(tmp_path).unlink(missing_ok=True)
+    return documents
+
+def prune_pdf_cache() -> None:
+    """
+    Keep the parsed-PDF cache bounded: drop entries unused for PDF_CACHE_MAX_AGE,
+    then the least recently used ones until it fits in PDF_CACHE_MAX_BYTES.
+    """
+    # Entries from the old pickle format are never read again
+    for path in PDF_CACHE_DIR.glob("*.pkl"):
+        path.unlink(missing_ok=True)
 
-    for file in uploaded_files:
+    now = time.time()
+    entries = []
+    for path in PDF_CACHE_DIR.glob("*.json"):
         try:
-            save_path = UPLOAD_DIR / file.filename
+            stat = path.stat()
+        except FileNotFoundError:   # removed by a concurrent prune
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, path in entries:
+        if now - mtime <= PDF_CACHE_MAX_AGE and total <= PDF_CACHE_MAX_BYTES:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+# Per-file Ingestion
+async def _process_file(
+    file: UploadFile,
+    file_index: int,
+    role: str,
+    doc_id: str,
+    semaphore: asyncio.Semaphore
+) -> None:
+    """Save, load, split, embed and upsert a single uploaded file."""
+    loop = asyncio.get_running_loop()
+
+    # Prefixed so same-named files in concurrent uploads never collide
+    save_path = UPLOAD_DIR / f"{doc_id}_{file_index}_{file.filename}"
+
+    stored_ids: List[str] = []   # chunk rows written to Mongo, removed again on failure
 
-            print(f"Starting upload: {file.filename}")
-            await save_uploaded_file_async(file, save_path)
+    async with semaphore:
+        try:
+            logger.info(f"Starting upload: {file.filename}")
+            file_hash = await save_uploaded_file_async(file, save_path)
 
-            print(f"Loading document: {file.filename}")
-            loader = PyPDFLoader(str(save_path))
-            documents = await loop.run_in_executor(None, loader.load)
+            logger.info(f"Loading document: {file.filename}")
+            documents = await loop.run_in_executor(None, load_documents_cached, save_path, file_hash)
 
             if not documents:
-                print(f"Warning: No content loaded from {file.filename}")
-                os.remove(save_path)
-                continue
+                logger.warning(f"No content loaded from {file.filename}")
+                await aiofiles.os.remove(save_path)
+                return
 
             # 3. Split into chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=500,
-                chunk_overlap=100,
-                length_function=len,
-                add_start_index=True
-            )
             chunks = text_splitter.split_documents(documents)
 
             if not chunks:
-                print(f"No meaningful chunks in {file.filename}")
-                os.remove(save_path)
-                continue
+                logger.warning(f"No meaningful chunks in {file.filename}")
+                await aiofiles.os.remove(save_path)
+                return
 
-            print(f"→ {file.filename}: {len(chunks)} chunks created")
+            logger.info(f"→ {file.filename}: {len(chunks)} chunks created")
 
             # Prepare texts, ids, metadatas
             texts = [chunk.page_content for chunk in chunks]
-            ids = [f"{doc_id}_{i}" for i in range(len(chunks))]
+            ids = [f"{doc_id}_{file_index}_{i}" for i in range(len(chunks))]
             metadatas = [
                 {
-                    "text": chunk.page_content,
                     "source": file.filename,
                     "doc_id": doc_id,
                     "role": role,
@@ -127,23 +216,39 @@ async def load_vectorstore_async(
                 for chunk in chunks
             ]
 
-            # 4. Generate embeddings with progress
-            print(f"Generating embeddings ({len(texts)} chunks)...")
-            embeddings = []
-            for text in tqdm(texts, desc=f"Embedding {file.filename}"):
-                emb = await embed_model.aembed_query(text)
-                embeddings.append(emb)
+            # 4. Generate embeddings in concurrent batches, logging progress
+            logger.info(f"Generating embeddings ({len(texts)} chunks)...")
+            batches = [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+            report = _progress_logger(f"Embedding {file.filename}", len(texts))
+
+            async def embed_batch(batch: List[str]) -> List[List[float]]:
+                batch_embeddings = await embed_model.aembed_documents(batch)
+                report(len(batch))
+                return batch_embeddings
+
+            results = await asyncio.gather(*(embed_batch(b) for b in batches))
+            embeddings = [emb for batch_embeddings in results for emb in batch_embeddings]
 
-            # 5. Prepare vectors for upsert
+            # 5. Store chunk text in Mongo (kept out of Pinecone metadata) and prepare vectors
+            stored_ids = ids
+            await chunks_collection.insert_many(
+                [
+                    {"_id": chunk_id, "text": text, "source": file.filename, "doc_id": doc_id, "role": role}
+                    for chunk_id, text in zip(ids, texts)
+                ],
+                ordered=False
+            )
             vectors = list(zip(ids, embeddings, metadatas))
 
-            # 6. Upsert in batches with progress
-            print(f"Upserting {len(vectors)} vectors to Pinecone (namespace: {role})...")
+            # 6. Upsert in concurrent batches, logging progress
+            logger.info(f"Upserting {len(vectors)} vectors to Pinecone (namespace: {role})...")
             batch_size = 100
             total = len(vectors)
-            with tqdm(total=total, desc="Upserting", unit="vec") as pbar:
-                for i in range(0, total, batch_size):
-                    batch = vectors[i:i + batch_size]
+            upsert_semaphore = asyncio.Semaphore(UPSERT_CONCURRENCY)
+            report = _progress_logger(f"Upserting {file.filename}", total)
+
+            async def upsert_batch(batch: list) -> None:
+                async with upsert_semaphore:
                     await loop.run_in_executor(
                         None,
                         lambda b=batch: index.upsert(
@@ -151,17 +256,55 @@ async def load_vectorstore_async(
                             namespace=role
                         )
                     )
-                    pbar.update(len(batch))
+                report(len(batch))
+
+            await asyncio.gather(
+                *(upsert_batch(vectors[i:i + batch_size]) for i in range(0, total, batch_size))
+            )
 
-            print(f"Successfully indexed: {file.filename} (doc_id: {doc_id})")
+            logger.info(f"Successfully indexed: {file.filename} (doc_id: {doc_id})")
 
-            os.remove(save_path)
-            print(f"Temp file removed: {save_path}")
+            await aiofiles.os.remove(save_path)
+            logger.info(f"Temp file removed: {save_path}")
 
         except Exception as e:
-            print(f"Error processing {file.filename}: {str(e)}")
-            if save_path.exists():
-                os.remove(save_path)
-            continue
+            logger.error(f"Error processing {file.filename}: {str(e)}")
+            if stored_ids:
+                # Don't leave chunk text behind for vectors that never made it to Pinecone
+                try:
+                    await chunks_collection.delete_many({"doc_id": doc_id, "_id": {"$in": stored_ids}})
+                except Exception as cleanup_error:
+                    logger.error(f"Failed to remove chunks of {file.filename}: {str(cleanup_error)}")
+            if await aiofiles.os.path.exists(save_path):
+                await aiofiles.os.remove(save_path)
+
+# Main Async Ingestion Function
+async def load_vectorstore_async(
+    uploaded_files: List[UploadFile],
+    role: str,
+    doc_id: str
+) -> None:
+    """
+    Async document ingestion pipeline with progress tracking.
+    - Saves uploaded files temporarily
+    - Loads, splits, embeds, and upserts to Pinecone
+    - Uses role as namespace for access control
+    - Processes up to DOC_CONCURRENCY files at a time
+    """
+    valid_roles = ["Employee", "Team Lead", "HR Executive", "HR Manager"]
+    if role not in valid_roles:
+        raise ValueError(f"Invalid role: {role}. Must be one of {valid_roles}")
+
+    semaphore = asyncio.Semaphore(DOC_CONCURRENCY)
+
+    # Each file handles its own errors; return_exceptions keeps one bad file
+    # from cancelling the rest of the batch
+    await asyncio.gather(
+        *(
+            _process_file(file, i, role, doc_id, semaphore)
+            for i, file in enumerate(uploaded_files)
+        ),
+        return_exceptions=True
+    )
 
-    print("\nAll documents processed and indexed successfully!")
\ No newline at end of file
+    logger.info("All documents processed and indexed successfully!")
\ No newline at end of file
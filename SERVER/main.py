@@ -1,22 +1,33 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from contextlib import asynccontextmanager
 import logging
 
 from auth.routes import router as auth_router
 from docs.routes import router as docs_router
 from chat.routes import router as chat_router
+from config.db import ping_db, create_indexes
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ping_db()
+    await create_indexes()
+    yield
+
 app = FastAPI(
     title="HR Document & Query System API",
     description="Secure HR system with role-based access and RAG chat",
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
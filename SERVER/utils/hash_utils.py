@@ -1,9 +1,18 @@
+import os
+import asyncio
 import bcrypt
 
+# Cost factor for new hashes; existing hashes keep the rounds they were made with
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
 def hash_password(password: str) -> str:
     """Hash a plain text password"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(password:str , hashed: str)-> bool:
     """Verify a plain text password against a hashed password"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
\ No newline at end of file
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    """verify_password on a worker thread, so bcrypt never blocks the event loop"""
+    return await asyncio.to_thread(verify_password, password, hashed)
\ No newline at end of file